@@ -1,21 +1,33 @@
 """Systemd molly guard suite to prevent accidental
 reboots and provide autodecrypt option for LUKS.
 """
-from argparse import ArgumentParser, Namespace
-from configparser import ConfigParser
-from os import urandom
-from sys import argv
+from __future__ import annotations
+from functools import cache
+from os import O_DIRECTORY, O_NOCTTY, O_RDONLY, O_RDWR, POSIX_SPAWN_DUP2
+from os import close, devnull, environ, execvp, fsync, kill, makedirs
+from os import open as os_open, pipe
+from os import posix_spawnp, read, readlink, replace, unlink, waitpid
+from os import waitstatus_to_exitcode, write
+from os.path import basename, dirname, exists, join
+from signal import SIG_DFL, SIGKILL, SIGPIPE, SIGXFSZ, signal
+from sys import argv, stderr, stdout
 from logging import getLogger
-from pathlib import Path
-from socket import gethostname
-from subprocess import CalledProcessError, check_call
-from typing import Iterable, Iterator, Union
+from subprocess import CalledProcessError
+from tomllib import TOMLDecodeError, load
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterable, NamedTuple
 
+if TYPE_CHECKING:
+    from argparse import Namespace
 
-CONFIG_FILE = "/etc/mollyguardctl.conf"
-CONFIG = ConfigParser()
+    Arguments = Namespace | SimpleNamespace
+
+
+CONFIG_FILE = "/etc/mollyguardctl.toml"
 CRYPTSETUP = "/usr/bin/cryptsetup"
-DEFAULT_UNITS = {
+LEGACY_CONFIG_FILE = "/etc/mollyguardctl.conf"
+KEYSLOT_PATTERNS = (r"^Key Slot (\d+): ENABLED$", r"^\s+(\d+): luks2$")
+DEFAULT_UNITS = (
     "halt.target",
     "hibernate.target",
     "poweroff.target",
@@ -23,19 +35,18 @@ DEFAULT_UNITS = {
     "shutdown.target",
     "suspend.target",
     "suspend-then-hibernate.target",
-}
-LOGGER = getLogger(Path(argv[0]).name or __file__)
+)
+LOGGER = getLogger(basename(argv[0]) or __file__)
+STATE_FILE = "/var/lib/mollyguardctl/keyslot.state"
 SYSTEMCTL = "/usr/bin/systemctl"
+SYSTEMD_SYSTEM_DIR = "/etc/systemd/system"
+TTY = "/dev/tty"
 
 
 class ConfigurationError(Exception):
     """Indicates an error in the configuration."""
 
 
-class LUKSNotConfigured(Exception):
-    """Indicates that LUKS is not configured."""
-
-
 class ChallengeFailed(Exception):
     """Indicates that a user challenge failed."""
 
@@ -44,63 +55,286 @@ class UserAbort(Exception):
     """Indicates that the user aborted a challenge."""
 
 
-def get_units() -> Iterable[str]:
+def is_int(value: Any) -> bool:
+    """Checks whether the value is an integer but not a boolean."""
+
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class LUKSSettings(NamedTuple):
+    """LUKS auto-decryption settings."""
+
+    device: str
+    keyfile: str
+    keysize: int = 2048
+    itertime: int = 200
+
+    @classmethod
+    def from_dict(cls, section: Any) -> LUKSSettings:
+        """Creates the LUKS settings from a config table."""
+
+        if not isinstance(section, dict):
+            raise ConfigurationError("LUKS is not a table.")
+
+        try:
+            device = section["device"]
+        except KeyError:
+            raise ConfigurationError("Missing LUKS device.") from None
+
+        if not isinstance(device, str):
+            raise ConfigurationError("LUKS device is not a string.")
+
+        try:
+            keyfile = section["keyfile"]
+        except KeyError:
+            raise ConfigurationError("Missing LUKS key file.") from None
+
+        if not isinstance(keyfile, str):
+            raise ConfigurationError("LUKS key file is not a string.")
+
+        if not is_int(keysize := section.get("keysize", 2048)):
+            raise ConfigurationError("Key size is not an integer.")
+
+        if keysize <= 0:
+            raise ConfigurationError("Key size is not positive.")
+
+        if not is_int(itertime := section.get("itertime", 200)):
+            raise ConfigurationError("Iteration time is not an integer.")
+
+        if itertime <= 0:
+            raise ConfigurationError("Iteration time is not positive.")
+
+        return cls(device, keyfile, keysize, itertime)
+
+
+class Settings(NamedTuple):
+    """The parsed configuration.
+
+    The LUKS table is kept as-is and only validated by get_luks_settings(),
+    so that errors in it do not keep start and stop from (un)masking units.
+    For the same reason, a leftover legacy INI configuration only blocks
+    the LUKS actions, which cannot tell whether LUKS was configured there.
+    """
+
+    units: tuple[str, ...] = DEFAULT_UNITS
+    systemctl: str = SYSTEMCTL
+    cryptsetup: str = CRYPTSETUP
+    hostname_challenge: bool = True
+    luks: Any = None
+    legacy: bool = False
+
+    @classmethod
+    def from_dict(cls, config: dict[str, Any]) -> Settings:
+        """Creates the settings from a config dict."""
+
+        if not isinstance(mollyguard := config.get("MollyGuard", {}), dict):
+            raise ConfigurationError("MollyGuard is not a table.")
+
+        try:
+            units = mollyguard["units"]
+        except KeyError:
+            units = DEFAULT_UNITS
+        else:
+            if not isinstance(units, list) or not all(
+                isinstance(unit, str) for unit in units
+            ):
+                raise ConfigurationError("Units is not a list.")
+
+            units = tuple(units)
+
+        if not isinstance(hostname := mollyguard.get("hostname", True), bool):
+            raise ConfigurationError("Hostname is not a boolean.")
+
+        if not isinstance(systemctl := mollyguard.get("systemctl", SYSTEMCTL), str):
+            raise ConfigurationError("Systemctl is not a string.")
+
+        if not isinstance(cryptsetup := mollyguard.get("cryptsetup", CRYPTSETUP), str):
+            raise ConfigurationError("Cryptsetup is not a string.")
+
+        return cls(
+            units=units,
+            systemctl=systemctl,
+            cryptsetup=cryptsetup,
+            hostname_challenge=hostname,
+            luks=config.get("LUKS"),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Settings:
+        """Reads and parses the configuration file once."""
+
+        try:
+            with open(path, "rb") as file:
+                config = load(file)
+        except FileNotFoundError:
+            if not exists(LEGACY_CONFIG_FILE):
+                return cls()
+
+            LOGGER.warning(
+                "Ignoring legacy configuration %s. Migrate it to %s.",
+                LEGACY_CONFIG_FILE,
+                path,
+            )
+            return cls(legacy=True)
+        except OSError as error:
+            raise ConfigurationError(f"Cannot read configuration: {error}") from None
+        except TOMLDecodeError as error:
+            raise ConfigurationError(f"Invalid configuration: {error}") from None
+
+        return cls.from_dict(config)
+
+
+SETTINGS = Settings()
+
+
+def get_units() -> tuple[str, ...]:
     """Returns the respective units."""
 
-    try:
-        units = CONFIG["MollyGuard"]["units"]
-    except KeyError:
-        return DEFAULT_UNITS
+    return SETTINGS.units
 
-    return units.split()
 
+def get_luks_settings() -> LUKSSettings | None:
+    """Returns the LUKS settings if LUKS is configured.
 
-def get_luks_settings() -> Iterator[Union[str, int]]:
-    """Returns the LUKS settings."""
+    Raises ConfigurationError if the LUKS table is invalid.
+    """
 
-    try:
-        luks = CONFIG["LUKS"]
-    except KeyError:
-        raise LUKSNotConfigured() from None
+    if SETTINGS.legacy:
+        raise ConfigurationError(
+            f"Migrate {LEGACY_CONFIG_FILE} to {CONFIG_FILE} to use LUKS."
+        )
 
-    try:
-        yield luks["device"]
-    except KeyError:
-        raise ConfigurationError("Missing LUKS device.") from None
+    if SETTINGS.luks is None:
+        return None
+
+    return LUKSSettings.from_dict(SETTINGS.luks)
+
+
+def spawn(*command: str) -> int:
+    """Runs a command via posix_spawn() and waits for it to exit.
+
+    Raises CalledProcessError on a non-zero exit status like check_call().
+    Like check_call(), SIGPIPE and SIGXFSZ are reset to their defaults
+    in the child, since Python ignores them.
+    """
+
+    pid = posix_spawnp(command[0], command, environ, setsigdef=(SIGPIPE, SIGXFSZ))
+    wait_for(pid, command)
+    return 0
+
+
+def spawn_output(*command: str) -> bytes:
+    """Runs a command like spawn() and returns its standard output."""
+
+    read_end, write_end = pipe()
 
     try:
-        yield luks["keyfile"]
-    except KeyError:
-        raise ConfigurationError("Missing LUKS key file.") from None
+        pid = posix_spawnp(
+            command[0],
+            command,
+            environ,
+            file_actions=[(POSIX_SPAWN_DUP2, write_end, 1)],
+            setsigdef=(SIGPIPE, SIGXFSZ),
+        )
+    except BaseException:
+        close(read_end)
+        raise
+    finally:
+        close(write_end)
+
+    with open(read_end, "rb") as output:
+        return wait_for(pid, command, output)
+
+
+def wait_for(
+    pid: int, command: tuple[str, ...], output: BinaryIO | None = None
+) -> bytes:
+    """Waits for a spawned process, reading its output first if given.
+
+    Kills the process if interrupted and raises CalledProcessError
+    on a non-zero exit status.
+    """
 
     try:
-        yield luks.getint("keysize", fallback=2048)
-    except ValueError:
-        raise ConfigurationError("Key size is not an integer.") from None
+        data = b"" if output is None else output.read()
+        _, status = waitpid(pid, 0)
+    except BaseException:
+        kill(pid, SIGKILL)
+        waitpid(pid, 0)
+        raise
+
+    if returncode := waitstatus_to_exitcode(status):
+        raise CalledProcessError(returncode, command, data)
+
+    return data
 
 
 def systemctl(action: str, *units: str) -> int:
     """Invokes systemctl on the respective units."""
 
-    systemctl_ = CONFIG.get("MollyGuard", "systemctl", fallback=SYSTEMCTL)
-    return check_call((systemctl_, action, *units))
+    return spawn(SETTINGS.systemctl, action, *units)
 
 
 def cryptsetup(action: str, *args: str) -> int:
     """Runs cryptsetup."""
 
-    cryptsetup_ = CONFIG.get("MollyGuard", "cryptsetup", fallback=CRYPTSETUP)
-    return check_call((cryptsetup_, action, *args))
+    return spawn(SETTINGS.cryptsetup, action, *args)
+
+
+def is_masked(unit: str) -> bool:
+    """Checks whether the unit is masked in the system unit directory."""
+
+    try:
+        return readlink(join(SYSTEMD_SYSTEM_DIR, unit)) == devnull
+    except OSError:
+        return False
+
+
+def dbus_mask(units: Iterable[str], mask: bool = True) -> bool:
+    """Masks or unmasks the units via the systemd D-Bus API.
+
+    Returns False if pystemd is not available or the call failed,
+    in which case the caller shall fall back to systemctl.
+    """
+
+    try:
+        # pylint: disable=C0415
+        from pystemd.dbusexc import DBusBaseError
+        from pystemd.systemd1 import Manager
+    except ImportError:
+        return False
+
+    files = [unit.encode() for unit in units]
+
+    try:
+        with Manager() as manager:
+            if mask:
+                manager.Manager.MaskUnitFiles(files, False, False)
+            else:
+                manager.Manager.UnmaskUnitFiles(files, False)
+
+            manager.Manager.Reload()
+    except DBusBaseError as error:
+        LOGGER.debug("%s", error)
+        return False
+
+    return True
 
 
 def mask_systemd_units() -> bool:
     """Masks the configured systemd units."""
 
+    if not (units := [unit for unit in get_units() if not is_masked(unit)]):
+        return True
+
+    if dbus_mask(units):
+        return True
+
     try:
-        systemctl("mask", *get_units())
+        systemctl("mask", *units)
     except CalledProcessError as cpe:
         LOGGER.error("Could not mask some units.")
-        LOGGER.debug(cpe)
+        LOGGER.debug("%s", cpe)
         return False
 
     return True
@@ -109,121 +343,349 @@ def mask_systemd_units() -> bool:
 def unmask_systemd_units() -> bool:
     """Unmasks the configured systemd units."""
 
+    if not (units := [unit for unit in get_units() if is_masked(unit)]):
+        return True
+
+    if dbus_mask(units, mask=False):
+        return True
+
     try:
-        systemctl("unmask", *get_units())
+        systemctl("unmask", *units)
     except CalledProcessError as cpe:
         LOGGER.warning("Could not unmask some units.")
-        LOGGER.debug(cpe)
+        LOGGER.debug("%s", cpe)
         return False
 
     return True
 
 
-def unlock_luks() -> bool:
-    """Prepares the auto-unlocking of the respective LUKS volume."""
+def write_keyfile(keyfile: str, keysize: int) -> None:
+    """Atomically replaces the key file with a random key of the given size.
+
+    Both the key and the rename are synced to disk before returning.
+    """
+
+    # pylint: disable=C0415
+    from secrets import token_bytes
+    from tempfile import mkstemp
+
+    key = memoryview(token_bytes(keysize))
+    fd, tmp = mkstemp(prefix=".", suffix=".key", dir=dirname(keyfile))
 
     try:
-        device, keyfile, keysize = get_luks_settings()
+        try:
+            while key:
+                key = key[write(fd, key) :]
+
+            fsync(fd)
+        finally:
+            close(fd)
+
+        replace(tmp, keyfile)
+    except BaseException:
+        try:
+            unlink(tmp)
+        except FileNotFoundError:
+            pass
+
+        raise
+
+    directory = os_open(dirname(keyfile) or ".", O_RDONLY | O_DIRECTORY)
+
+    try:
+        fsync(directory)
+    finally:
+        close(directory)
+
+
+def get_key_digest(keyfile: str) -> str | None:
+    """Returns the SHA-256 digest of the key file if it exists."""
+
+    from hashlib import sha256  # pylint: disable=C0415
+
+    try:
+        with open(keyfile, "rb") as key:
+            return sha256(key.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def get_keyslots(device: str) -> set[int] | None:
+    """Returns the active keyslots of the LUKS device."""
+
+    from re import MULTILINE, findall  # pylint: disable=C0415
+
+    try:
+        dump = spawn_output(SETTINGS.cryptsetup, "luksDump", device).decode()
+    except CalledProcessError as cpe:
+        LOGGER.debug("%s", cpe)
+        return None
+    except KeyboardInterrupt:
+        raise UserAbort() from None
+
+    return {
+        int(slot)
+        for pattern in KEYSLOT_PATTERNS
+        for slot in findall(pattern, dump, MULTILINE)
+    }
+
+
+def store_keyslot_state(digest: str, slot: int) -> None:
+    """Stores the digest and keyslot of the enrolled key file."""
+
+    makedirs(dirname(STATE_FILE), mode=0o700, exist_ok=True)
+
+    with open(STATE_FILE, "w", encoding="ascii") as state:
+        state.write(f"{digest} {slot}\n")
+
+
+def clear_keyslot_state() -> None:
+    """Forgets the enrolled key file."""
+
+    try:
+        unlink(STATE_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def keyslot_present(luks: LUKSSettings) -> bool:
+    """Checks whether the current key file is enrolled in the LUKS volume.
+
+    Only the recorded keyslot is tested, so that the KDFs
+    of the other keyslots are not run.
+    """
+
+    try:
+        with open(STATE_FILE, encoding="ascii") as state:
+            digest, slot = state.read().split()
+    except (FileNotFoundError, ValueError):
+        return False
+
+    if digest != get_key_digest(luks.keyfile) or not slot.isdigit():
+        return False
+
+    try:
+        cryptsetup(
+            "open",
+            "--test-passphrase",
+            "--key-slot",
+            slot,
+            "--key-file",
+            luks.keyfile,
+            luks.device,
+        )
+    except CalledProcessError:
+        return False
+    except KeyboardInterrupt:
+        raise UserAbort() from None
+
+    return True
+
+
+def unlock_luks(rotate: bool = False) -> bool:
+    """Prepares the auto-unlocking of the respective LUKS volume.
+
+    If the current key file is already enrolled, the expensive
+    luksAddKey is skipped unless the key is to be rotated.
+    """
+
+    try:
+        luks = get_luks_settings()
     except ConfigurationError as error:
-        LOGGER.error(error)
+        LOGGER.error("%s", error)
         return False
 
-    with Path(keyfile).open("wb") as key:
-        key.write(urandom(keysize))
+    if luks is None:
+        LOGGER.warning("LUKS is not configured.")
+        return False
+
+    if keyslot_present(luks):
+        if not rotate:
+            LOGGER.info("Auto-decrypt key is already enrolled.")
+            return True
+
+        if not clear_luks():
+            return False
+
+    slots = get_keyslots(luks.device)
+    write_keyfile(luks.keyfile, luks.keysize)
 
     try:
-        cryptsetup("luksAddKey", device, keyfile)
+        cryptsetup(
+            "luksAddKey",
+            "--iter-time",
+            str(luks.itertime),
+            luks.device,
+            luks.keyfile,
+        )
     except CalledProcessError:
         LOGGER.error("Could not add auto-decrypt key to LUKS volume.")
         return False
     except KeyboardInterrupt:
         raise UserAbort() from None
 
+    clear_keyslot_state()
+
+    if slots is None or (enrolled := get_keyslots(luks.device)) is None:
+        return True
+
+    if len(added := enrolled - slots) != 1:
+        LOGGER.warning("Could not determine the auto-decrypt keyslot.")
+        return True
+
+    if (digest := get_key_digest(luks.keyfile)) is not None:
+        store_keyslot_state(digest, added.pop())
+
     return True
 
 
 def clear_luks() -> bool:
     """Clears the LUKS auto-decrypt key from the LUKS device."""
 
-    device, keyfile, *_ = get_luks_settings()
-
     try:
-        cryptsetup("luksRemoveKey", device, keyfile)
-    except CalledProcessError:
-        LOGGER.error("Could not clear LUKS key from %s.", device)
+        luks = get_luks_settings()
+    except ConfigurationError as error:
+        LOGGER.error("%s", error)
         return False
-    except LUKSNotConfigured:
+
+    if luks is None:
         LOGGER.warning("LUKS is not configured.")
         return False
-    except ConfigurationError as error:
-        LOGGER.error(error)
+
+    try:
+        cryptsetup("luksRemoveKey", luks.device, luks.keyfile)
+    except CalledProcessError:
+        LOGGER.error("Could not clear LUKS key from %s.", luks.device)
         return False
 
+    clear_keyslot_state()
     return True
 
 
+@cache
+def get_hostname() -> str:
+    """Returns the host name."""
+
+    from socket import gethostname  # pylint: disable=C0415
+
+    return gethostname()
+
+
+def discard_input(tty: int) -> None:
+    """Discards unread input on the terminal.
+
+    Otherwise, the remainder of an overlong line would be read
+    and run by the calling shell after we exit.
+    """
+
+    from termios import TCIFLUSH, error, tcflush  # pylint: disable=C0415
+
+    try:
+        tcflush(tty, TCIFLUSH)
+    except error:
+        pass
+
+
 def challenge_hostname() -> bool:
     """Challenge the user to enter the correct host name."""
 
     try:
-        hostname = input("Enter hostname: ")
-    except (EOFError, KeyboardInterrupt):
-        print(flush=True)
+        tty = os_open(TTY, O_RDWR | O_NOCTTY)
+    except OSError:
         raise UserAbort() from None
 
-    return hostname == gethostname()
+    try:
+        write(tty, b"Enter hostname: ")
 
+        if not (line := read(tty, 256)):
+            write(tty, b"\n")
+    except KeyboardInterrupt:
+        write(tty, b"\n")
+        line = b""
+    except OSError:
+        line = b""
+    finally:
+        discard_input(tty)
+        close(tty)
 
-def mollyguard() -> None:
-    """Runs mollyguard checks."""
+    if not line:
+        raise UserAbort()
 
-    ch_hostname = CONFIG.getboolean("MollyGuard", "hostname", fallback=True)
+    from hmac import compare_digest  # pylint: disable=C0415
 
-    if ch_hostname and not challenge_hostname():
-        LOGGER.error('Wrong host name. It actually is: "%s".', gethostname())
+    return compare_digest(line.rstrip(b"\r\n"), get_hostname().encode())
+
+
+def mollyguard(rotate_key: bool = False) -> None:
+    """Runs mollyguard checks."""
+
+    if SETTINGS.hostname_challenge and not challenge_hostname():
+        LOGGER.error('Wrong host name. It actually is: "%s".', get_hostname())
         raise ChallengeFailed("hostname")
 
-    try:
-        if not unlock_luks():
-            raise ChallengeFailed("LUKS")
-    except LUKSNotConfigured:
-        pass
+    if (SETTINGS.luks is not None or SETTINGS.legacy) and not unlock_luks(rotate_key):
+        raise ChallengeFailed("LUKS")
 
 
 def reboot() -> bool:
-    """Reboots the device."""
+    """Reboots the device.
+
+    On success, the process is replaced by systemctl and does not return.
+    """
 
     if not unmask_systemd_units():
         return False
 
+    stdout.flush()
+    stderr.flush()
+
+    handlers = {signum: signal(signum, SIG_DFL) for signum in (SIGPIPE, SIGXFSZ)}
+
     try:
-        systemctl("reboot")
-    except CalledProcessError as cpe:
+        execvp(SETTINGS.systemctl, (SETTINGS.systemctl, "reboot"))
+    except OSError as error:
+        for signum, handler in handlers.items():
+            signal(signum, handler)
+
         LOGGER.warning("Could not reboot.")
-        LOGGER.debug(cpe)
-        return False
+        LOGGER.debug("%s", error)
 
-    return True
+    return False
 
 
-def get_args() -> Namespace:
-    """Returns the command line arguments."""
+def start(_: Arguments) -> int:
+    """Starts mollyguarding."""
 
-    parser = ArgumentParser(description="Molly guard control CLI.")
-    subparsers = parser.add_subparsers(dest="action", required=True)
-    subparsers.add_parser("start", help="start mollyguarding")
-    subparsers.add_parser("stop", help="stop mollyguarding")
-    subparsers.add_parser("unlock", help="unlock LUKS")
-    subparsers.add_parser("reboot", help="reboot the system")
-    subparsers.add_parser("clear-luks", help="clear LUKS auto-decryption key")
-    return parser.parse_args()
+    return 0 if mask_systemd_units() else 1
 
 
-def mollyguard_functions(args: Namespace) -> int:
-    """Runs mollyguard-protected functions."""
+def stop(_: Arguments) -> int:
+    """Stops mollyguarding."""
+
+    return 0 if unmask_systemd_units() else 1
+
+
+def unlock(args: Arguments) -> int:
+    """Unlocks LUKS."""
 
     try:
-        mollyguard()
+        return 0 if unlock_luks(args.rotate_key) else 1
+    except UserAbort:
+        LOGGER.error("Aborted by user.")
+        return 2
+
+
+def clear(_: Arguments) -> int:
+    """Clears the LUKS auto-decryption key."""
+
+    return 0 if clear_luks() else 1
+
+
+def guarded_reboot(args: Arguments) -> int:
+    """Reboots the system after passing the mollyguard checks."""
+
+    try:
+        mollyguard(args.rotate_key)
     except ChallengeFailed as challenge:
         LOGGER.error("Challenge %s failed.", challenge)
         return 1
@@ -231,28 +693,64 @@ def mollyguard_functions(args: Namespace) -> int:
         LOGGER.error("Aborted by user.")
         return 2
 
-    if args.action == "reboot":
-        return 0 if reboot() else 1
+    return 0 if reboot() else 1
 
-    return 1
 
+ACTIONS = {
+    "start": start,
+    "stop": stop,
+    "unlock": unlock,
+    "reboot": guarded_reboot,
+    "clear-luks": clear,
+}
 
-def main() -> int:
-    """Runs the main program."""
 
-    args = get_args()
-    CONFIG.read(CONFIG_FILE)
+def get_args() -> Arguments:
+    """Returns the command line arguments.
 
-    if args.action == "start":
-        return 0 if mask_systemd_units() else 1
+    Invocations consisting of a bare action, as used by the systemd
+    units, are resolved without importing and building argparse.
+    """
 
-    if args.action == "stop":
-        return 0 if unmask_systemd_units() else 1
+    if len(argv) == 2 and (func := ACTIONS.get(argv[1])):
+        return SimpleNamespace(action=argv[1], func=func, rotate_key=False)
 
-    if args.action == "clear-luks":
-        return 0 if clear_luks() else 1
+    from argparse import ArgumentParser  # pylint: disable=C0415
 
-    if args.action == "unlock":
-        return 0 if unlock_luks() else 1
+    parser = ArgumentParser(description="Molly guard control CLI.")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    start_parser = subparsers.add_parser("start", help="start mollyguarding")
+    start_parser.set_defaults(func=start)
+    stop_parser = subparsers.add_parser("stop", help="stop mollyguarding")
+    stop_parser.set_defaults(func=stop)
+    unlock_parser = subparsers.add_parser("unlock", help="unlock LUKS")
+    unlock_parser.add_argument(
+        "--rotate-key", action="store_true", help="replace an enrolled LUKS key"
+    )
+    unlock_parser.set_defaults(func=unlock)
+    reboot_parser = subparsers.add_parser("reboot", help="reboot the system")
+    reboot_parser.add_argument(
+        "--rotate-key", action="store_true", help="replace an enrolled LUKS key"
+    )
+    reboot_parser.set_defaults(func=guarded_reboot)
+    clear_parser = subparsers.add_parser(
+        "clear-luks", help="clear LUKS auto-decryption key"
+    )
+    clear_parser.set_defaults(func=clear)
+    return parser.parse_args()
+
+
+def main() -> int:
+    """Runs the main program."""
+
+    global SETTINGS  # pylint: disable=W0603
+
+    args = get_args()
+
+    try:
+        SETTINGS = Settings.load(CONFIG_FILE)
+    except ConfigurationError as error:
+        LOGGER.error("%s", error)
+        return 1
 
-    return mollyguard_functions(args)
+    return args.func(args)
@@ -11,8 +11,9 @@ setup(
     setup_requires=["setuptools_scm"],
     author="Richard Neumann",
     author_email="mail@richard-neumann.de",
-    python_requires=">=3.8",
+    python_requires=">=3.11",
     py_modules=["mollyguardctl"],
+    extras_require={"dbus": ["pystemd"]},
     entry_points={"console_scripts": ["mollyguardctl = mollyguardctl:main"]},
     url="https://github.com/conqp/",
     license="GPLv3",